@@ -1,23 +1,115 @@
+import array
+import asyncio
 import configparser
+import errno
 import glob
 import logging
-import threading
-from typing import List, Tuple, Optional
+import os
+import select
+import signal
+import struct
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, Optional
 
 import colorlog
+import pyudev
 import serial
-from evdev import InputDevice, list_devices, ecodes, InputEvent
+from evdev import InputDevice, ecodes
 from serial.serialutil import SerialException
 
-config = configparser.ConfigParser()
-config.read('config.ini')
 
-CONTROLLER_NAME: str = config.get('Settings', 'CONTROLLER_NAME')
-SABERTOOTH_ADDRESS: int = config.getint('Settings', 'SABERTOOTH_ADDRESS')
-SABERTOOTH_SERIAL_PORTS: List[str] = config.get('Settings', 'SABERTOOTH_SERIAL_PORTS').split(', ')
-NIGHT_MODE: bool = config.getboolean('Settings', 'NIGHT_MODE')
-MAX_SPEED: int = config.getint('Settings', 'MAX_SPEED')
-DEAD_ZONE: int = config.getint('Settings', 'DEAD_ZONE')
+@dataclass(frozen=True)
+class Config:
+    controller_name: str
+    sabertooth_address: int
+    sabertooth_serial_ports: Tuple[str, ...]
+    night_mode: bool
+    max_speed: int
+    dead_zone: int
+
+
+def load_config(path: str) -> Config:
+    config = configparser.ConfigParser()
+    config.read(path)
+
+    return Config(
+        controller_name=config.get('Settings', 'CONTROLLER_NAME'),
+        sabertooth_address=config.getint('Settings', 'SABERTOOTH_ADDRESS'),
+        sabertooth_serial_ports=tuple(config.get('Settings', 'SABERTOOTH_SERIAL_PORTS').split(', ')),
+        night_mode=config.getboolean('Settings', 'NIGHT_MODE'),
+        max_speed=config.getint('Settings', 'MAX_SPEED'),
+        dead_zone=config.getint('Settings', 'DEAD_ZONE'),
+    )
+
+
+CONFIG = load_config('config.ini')
+
+HEARTBEAT_INTERVAL: float = 0.5
+SEND_INTERVAL: float = 0.01
+SERIAL_READ_SIZE: int = 4096
+SERIAL_WRITE_TIMEOUT: float = 0.05
+
+SABERTOOTH_PACKET = struct.Struct('<4B')
+# Motor speed after night mode clipping
+SPEED_CLIP = bytes(min(speed, 20) if CONFIG.night_mode else speed for speed in range(128))
+
+
+def build_packet(address: int, command: int, value: int) -> bytes:
+    value = SPEED_CLIP[value]
+    return SABERTOOTH_PACKET.pack(address, command, value, (address + command + value) & 0x7F)
+
+
+def build_motor_packets(forward_command: int, reverse_command: int) -> List[bytes]:
+    # Forward speeds 0..127 fill the front of the list and reverse speeds 127..1 the back, so indexing with a
+    # signed speed picks the right command and magnitude through Python's negative indexing
+    return ([build_packet(CONFIG.sabertooth_address, forward_command, speed) for speed in range(128)] +
+            [build_packet(CONFIG.sabertooth_address, reverse_command, speed) for speed in range(127, 0, -1)])
+
+
+# Sabertooth command for each motor, indexed by motor and then whether its speed is negative
+MOTOR_COMMANDS = ((1, 0), (4, 5))
+# Every packet each motor can be sent, indexed by motor and then signed, unclipped speed
+MOTOR_PACKETS = tuple(build_motor_packets(*commands) for commands in MOTOR_COMMANDS)
+# Reused to send both motors' packets in one write without allocating a new buffer each time
+PACKET_PAIR = bytearray(SABERTOOTH_PACKET.size * 2)
+
+# Kernel struct input_event: timeval seconds and microseconds, then type, code and value
+INPUT_EVENT = struct.Struct('llHHi')
+INPUT_EVENT_BATCH = 64
+
+
+def split_port_pattern(pattern: str) -> Optional[Tuple[str, str]]:
+    # Only a single trailing '*' can be matched as a plain file name prefix
+    stem = pattern[:-1]
+    if pattern.endswith('*') and not any(char in stem for char in '*?['):
+        return os.path.split(stem)
+    return None
+
+
+# SABERTOOTH_SERIAL_PORTS entries are glob patterns. The usual 'dir/prefix*' form is split into the directory and
+# file name prefix to scan for, and anything else is left to glob.
+SERIAL_PORT_PATTERNS = tuple((pattern, split_port_pattern(pattern)) for pattern in CONFIG.sabertooth_serial_ports)
+
+
+def build_stick_speeds(dead_zone: int) -> array.array:
+    speeds = array.array('b', bytes(65536))
+    for value in range(65536):
+        # Truncate toward zero like the original float scaling, so both stick directions scale and dead-zone alike
+        scaled = (value - 32767) * 126
+        speed = scaled // 32767 if scaled >= 0 else -(-scaled // 32767)
+        if not -dead_zone < speed < dead_zone:
+            speeds[value] = speed
+    return speeds
+
+
+# Motor driven by each stick axis, and the dead-zoned motor speed for every raw axis value
+STICK_MOTORS = {ecodes.ABS_Y: 0, ecodes.ABS_RY: 1}
+STICK_SPEEDS = build_stick_speeds(CONFIG.dead_zone)
+UNUSED_ABS_CODES = frozenset((ecodes.ABS_X, ecodes.ABS_Z, ecodes.ABS_RX, ecodes.ABS_RZ,
+                              ecodes.ABS_HAT0X, ecodes.ABS_HAT0Y))
+BUTTON_CODES = range(304, 314)  # BTN_SOUTH to BTN_TR2
+FF_CODES = range(80, 97)  # FF_RUMBLE to FF_GAIN
 
 
 def init_logger() -> Tuple[logging.Logger, logging.Logger]:
@@ -43,23 +135,67 @@ def init_logger() -> Tuple[logging.Logger, logging.Logger]:
 
     handler = logging.StreamHandler()
     handler.setFormatter(formatter)
-    logging.getLogger().setLevel(logging.DEBUG)
+    # Per-packet debug output is costly at control loop rates, so it is opt-in via WIZBOT_LOG_LEVEL=DEBUG
+    level_name = os.environ.get('WIZBOT_LOG_LEVEL', 'INFO').upper()
+    level = logging.getLevelName(level_name)
+    # getLevelName returns a string for unknown names, which setLevel would reject and crash-loop the service
+    level_known = isinstance(level, int)
+    logging.getLogger().setLevel(level if level_known else logging.INFO)
     logging.getLogger().addHandler(handler)
 
-    return logging.getLogger("Sabertooth"), logging.getLogger("RaspberryPi")
+    raspberry_pi_logger = logging.getLogger("RaspberryPi")
+    if not level_known:
+        raspberry_pi_logger.warning(f"Unknown WIZBOT_LOG_LEVEL '{level_name}', using INFO")
+
+    return logging.getLogger("Sabertooth"), raspberry_pi_logger
 
 
 sabertooth_logger, raspberry_pi_logger = init_logger()
 
 
-def find_controller() -> Optional[InputDevice]:
-    devices = [InputDevice(fn) for fn in list_devices()]
-    for device in devices:
-        if device.name == CONTROLLER_NAME:
-            return device
+def find_controller(udev_context: pyudev.Context) -> Optional[InputDevice]:
+    # Match on the name udev exposes from sysfs so only the controller's event node is opened
+    for device in udev_context.list_devices(subsystem='input'):
+        if not device.sys_name.startswith('event') or device.parent is None:
+            continue
+        try:
+            name = device.parent.attributes.asstring('name')
+        except KeyError:
+            continue
+        if name == CONFIG.controller_name:
+            return InputDevice(device.device_node)
     return None
 
 
+def start_device_monitor(udev_context: pyudev.Context) -> pyudev.Monitor:
+    monitor = pyudev.Monitor.from_netlink(udev_context)
+    monitor.filter_by('input')
+    monitor.filter_by('tty')
+    monitor.start()
+    return monitor
+
+
+async def wait_readable(fd: int) -> None:
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_reader(fd)
+
+
+async def wait_for_device_added(monitor: pyudev.Monitor) -> None:
+    while True:
+        await wait_readable(monitor.fileno())
+
+        added = False
+        for device in iter(lambda: monitor.poll(timeout=0), None):
+            added |= device.action == 'add'
+        if added:
+            return
+
+
 def ungrab_controller(controller: InputDevice) -> None:
     try:
         controller.ungrab()
@@ -70,29 +206,23 @@ def ungrab_controller(controller: InputDevice) -> None:
             raise
 
 
-def emergency_shutoff(ser: serial.Serial, emergency_stop: threading.Event, motor_speeds: List[int]) -> bool:
+def emergency_shutoff(ser: serial.Serial, emergency_stop: asyncio.Event, motor_speeds: List[int],
+                      prev_motor_packets: List[Optional[bytes]]) -> bool:
     emergency_stop.set()
     motor_speeds[0] = motor_speeds[1] = 0
-    command0 = send_packet(ser, SABERTOOTH_ADDRESS, 0, 0, emergency_stop)
-    command5 = send_packet(ser, SABERTOOTH_ADDRESS, 5, 0, emergency_stop)
+    prev_motor_packets[0] = prev_motor_packets[1] = None
+    command0 = send_packet(ser, CONFIG.sabertooth_address, 0, 0, emergency_stop)
+    command5 = send_packet(ser, CONFIG.sabertooth_address, 5, 0, emergency_stop)
     return command0 and command5
 
 
-def send_packet(ser: serial.Serial, address: int, command: int, value: int, emergency_stop: threading.Event) -> bool:
-    if NIGHT_MODE and value > 20:
-        value = 20
-        raspberry_pi_logger.debug(f"NIGHT MODE")
-
-    checksum = (address + command + value) & 0x7F
-    packet = bytearray(4)
-    packet[0] = address
-    packet[1] = command
-    packet[2] = value
-    packet[3] = checksum
+def send_packet(ser: serial.Serial, address: int, command: int, value: int, emergency_stop: asyncio.Event) -> bool:
+    packet = build_packet(address, command, value)
+    value = packet[2]
 
-    if value != 0:
-        raspberry_pi_logger.debug(f"Command ID: {command}, Motor Speed: {value}")
-        raspberry_pi_logger.debug(f"Sending packet: {packet}, Calculated Checksum: {checksum}")
+    if value != 0 and raspberry_pi_logger.isEnabledFor(logging.DEBUG):
+        raspberry_pi_logger.debug("Command ID: %d, Motor Speed: %d", command, value)
+        raspberry_pi_logger.debug("Sending packet: %s, Calculated Checksum: %d", packet.hex(), packet[3])
 
     if emergency_stop.is_set():
         raspberry_pi_logger.info("EMERGENCY STOP")
@@ -100,8 +230,8 @@ def send_packet(ser: serial.Serial, address: int, command: int, value: int, emer
             return True
 
     try:
+        # No flush: Sabertooth packet serial accepts back-to-back frames, and tcdrain would stall the event loop
         ser.write(packet)
-        ser.flush()
 
         return True
     except SerialException as e:
@@ -109,197 +239,432 @@ def send_packet(ser: serial.Serial, address: int, command: int, value: int, emer
         return False
 
 
-def handle_event(event: InputEvent, motor_speeds: List[int], ser: serial.Serial,
-                 emergency_stop: threading.Event) -> None:
+# Hot path functions bind globals as default arguments so they are read as fast locals
+def handle_abs_event(code: int, value: int, motor_speeds: List[int], prev_motor_packets: List[Optional[bytes]],
+                     ser: serial.Serial, emergency_stop: asyncio.Event,
+                     _STICK_MOTORS: Dict[int, int] = STICK_MOTORS, _STICK_SPEEDS: array.array = STICK_SPEEDS) -> bool:
+    motor = _STICK_MOTORS.get(code)
+    if motor is not None:
+        # The controller reports 0..65535. Anything outside is clamped to the stick's end stop, since a negative
+        # index would wrap around to full speed the other way and a large one would raise in the reader callback
+        if not 0 <= value <= 65535:
+            value = 0 if value < 0 else 65535
+        joystick_speed = _STICK_SPEEDS[value]
+
+        # Stick noise that scales to the same speed is not a change, so it doesn't wake the sender
+        if motor_speeds[motor] == joystick_speed:
+            return False
+        motor_speeds[motor] = joystick_speed
+        return True
+    elif code in UNUSED_ABS_CODES:
+        pass
+    return False
+
+
+def handle_key_event(code: int, value: int, motor_speeds: List[int], prev_motor_packets: List[Optional[bytes]],
+                     ser: serial.Serial, emergency_stop: asyncio.Event) -> bool:
+    if code == 139:  # KEY_MENU
+        if value == 1:  # Key press event
+            emergency_shutoff(ser, emergency_stop, motor_speeds, prev_motor_packets)  # Emergency shutoff
+    elif code in BUTTON_CODES:
+        pass
+    return False
+
+
+def handle_msc_event(code: int, value: int, motor_speeds: List[int], prev_motor_packets: List[Optional[bytes]],
+                     ser: serial.Serial, emergency_stop: asyncio.Event) -> bool:
+    if code == ecodes.MSC_SCAN:  # MSC_SCAN
+        pass
+    return False
+
+
+def handle_ff_event(code: int, value: int, motor_speeds: List[int], prev_motor_packets: List[Optional[bytes]],
+                    ser: serial.Serial, emergency_stop: asyncio.Event) -> bool:
+    if code in FF_CODES:
+        pass
+    return False
+
+
+def ignore_event(code: int, value: int, motor_speeds: List[int], prev_motor_packets: List[Optional[bytes]],
+                 ser: serial.Serial, emergency_stop: asyncio.Event) -> bool:
+    return False
+
+
+# Add handling for other event types here
+EVENT_HANDLERS = {
+    ecodes.EV_SYN: ignore_event,  # Event type 0 (EV_SYN)
+    ecodes.EV_KEY: handle_key_event,
+    ecodes.EV_ABS: handle_abs_event,
+    ecodes.EV_MSC: handle_msc_event,
+    21: handle_ff_event,  # EV_FF
+}
+
+
+def handle_event(event_type: int, code: int, value: int, motor_speeds: List[int],
+                 prev_motor_packets: List[Optional[bytes]], ser: serial.Serial, emergency_stop: asyncio.Event,
+                 _EVENT_HANDLERS: Dict[int, Callable[..., bool]] = EVENT_HANDLERS,
+                 _ignore_event: Callable[..., bool] = ignore_event) -> bool:
     if emergency_stop.is_set():
-        return
+        return False
 
-    if event.type == ecodes.EV_ABS:
-        if event.code in (ecodes.ABS_Y, ecodes.ABS_RY):
-            joystick_speed = int(((event.value - 32767) / 32767) * 126)
+    return _EVENT_HANDLERS.get(event_type, _ignore_event)(code, value, motor_speeds, prev_motor_packets, ser,
+                                                          emergency_stop)
 
-            if abs(joystick_speed) < DEAD_ZONE:
-                joystick_speed = 0
 
-            motor_speeds[0 if event.code == ecodes.ABS_Y else 1] = joystick_speed
+def write_packets(fd: int, packets: bytes) -> bool:
+    try:
+        written = os.write(fd, packets)
+    except BlockingIOError:
+        # The TX queue is full, so drop this update rather than stall the event loop; a newer one will follow
+        return False
 
-    # Add handling for other event types and codes
-    elif event.type == ecodes.EV_SYN:
-        pass  # Event type 0 (EV_SYN)
-    elif event.type == ecodes.EV_KEY:
-        if event.code == 139:  # KEY_MENU
-            if event.value == 1:  # Key press event
-                emergency_shutoff(ser, emergency_stop, motor_speeds)  # Emergency shutoff
-        elif event.code in range(304, 314):  # BTN_SOUTH to BTN_TR2
-            pass
-    elif event.type == ecodes.EV_ABS:
-        if event.code in (ecodes.ABS_X, ecodes.ABS_Y, ecodes.ABS_Z,
-                          ecodes.ABS_RX, ecodes.ABS_RY, ecodes.ABS_RZ,
-                          ecodes.ABS_HAT0X, ecodes.ABS_HAT0Y):
-            pass
-    elif event.type == ecodes.EV_MSC:
-        if event.code == ecodes.MSC_SCAN:  # MSC_SCAN
-            pass
-    elif event.type == 21:  # EV_FF
-        if event.code in range(80, 97):  # FF_RUMBLE to FF_GAIN
+    # Once part of a frame is queued the rest has to follow, or the Sabertooth loses sync. This blocks the
+    # event loop, so a port that stays stalled past the deadline is treated as failed.
+    view = memoryview(packets)[written:]
+    deadline = time.monotonic() + SERIAL_WRITE_TIMEOUT
+    while view:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+            raise OSError(errno.ETIMEDOUT, "Timed out finishing a partial motor packet write")
+        try:
+            view = view[os.write(fd, view):]
+        except BlockingIOError:
             pass
+    return True
 
 
-def send_motor_speeds(ser: serial.Serial, motor_speeds: List[int], emergency_stop: threading.Event) -> bool:
+def send_motor_speeds(ser_fd: int, motor_speeds: List[int], prev_motor_packets: List[Optional[bytes]],
+                      emergency_stop: asyncio.Event, speeds_changed: asyncio.Event,
+                      _RIGHT_PACKETS: List[bytes] = MOTOR_PACKETS[0], _LEFT_PACKETS: List[bytes] = MOTOR_PACKETS[1],
+                      _PACKET_PAIR: bytearray = PACKET_PAIR, _logger: logging.Logger = raspberry_pi_logger) -> bool:
     right_motor_speed, left_motor_speed = motor_speeds
 
-    right_motor_command = 1 if right_motor_speed >= 0 else 0
-    left_motor_command = 4 if left_motor_speed >= 0 else 5
-    right_motor_speed = abs(right_motor_speed)
-    left_motor_speed = abs(left_motor_speed)
+    if emergency_stop.is_set():
+        _logger.info("EMERGENCY STOP")
+        right_motor_speed = left_motor_speed = 0
+
+    right_packet = _RIGHT_PACKETS[right_motor_speed]
+    left_packet = _LEFT_PACKETS[left_motor_speed]
+
+    # Only motors whose packet changed since the last successful send are written, and both
+    # Sabertooth packets go out in a single write so they share one USB transfer
+    right_changed = right_packet != prev_motor_packets[0]
+    left_changed = left_packet != prev_motor_packets[1]
+
+    if right_changed and left_changed:
+        _PACKET_PAIR[:4] = right_packet
+        _PACKET_PAIR[4:] = left_packet
+        packets = _PACKET_PAIR
+    elif right_changed:
+        packets = right_packet
+    elif left_changed:
+        packets = left_packet
+    else:
+        return True
+
+    if (right_packet[2] != 0 or left_packet[2] != 0) and _logger.isEnabledFor(logging.DEBUG):
+        _logger.debug("Right Command ID: %d, Motor Speed: %d, Left Command ID: %d, Motor Speed: %d",
+                      right_packet[1], right_packet[2], left_packet[1], left_packet[2])
+        _logger.debug("Sending packets: %s", packets.hex())
 
-    success1 = send_packet(ser, SABERTOOTH_ADDRESS, right_motor_command, right_motor_speed, emergency_stop)
-    success2 = send_packet(ser, SABERTOOTH_ADDRESS, left_motor_command, left_motor_speed, emergency_stop)
+    # Written straight to the port's fd, skipping pyserial's write wrapper and the tcdrain in flush()
+    try:
+        if not write_packets(ser_fd, packets):
+            _logger.warning("Serial output buffer full, dropped motor packets")
+            # Retry on the next tick rather than at the next stick change or heartbeat, since the dropped
+            # packet may be the stop from releasing the stick
+            speeds_changed.set()
+            return True
 
-    if success1 and success2:
+        prev_motor_packets[0] = right_packet
+        prev_motor_packets[1] = left_packet
         return True
-    else:
+    except OSError as e:
+        _logger.error(f"Error sending packets to Sabertooth: {e}")
         return False
 
 
-def motor_speed_sender(ser: serial.Serial, motor_speeds: List[int], communication_stop: threading.Event,
-                       emergency_stop: threading.Event) -> None:
-    while not communication_stop.is_set():
-        if motor_speeds[0] is None:
-            motor_speeds[0] = 0
-        if motor_speeds[1] is None:
-            motor_speeds[1] = 0
+async def motor_speed_sender(ser: serial.Serial, motor_speeds: List[int],
+                             prev_motor_packets: List[Optional[bytes]], emergency_stop: asyncio.Event,
+                             speeds_changed: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    ser_fd = ser.fileno()
+    next_heartbeat = loop.time() + HEARTBEAT_INTERVAL
+    while True:
+        # Wake on new joystick input, or at the next heartbeat deadline so the Sabertooth keeps hearing from us.
+        # Deadlines advance by a fixed step so joystick wakeups don't push the heartbeat back.
+        try:
+            await asyncio.wait_for(speeds_changed.wait(), max(0.0, next_heartbeat - loop.time()))
+        except asyncio.TimeoutError:
+            # Forget the packets last sent so the heartbeat resends both motors even if nothing changed
+            prev_motor_packets[0] = prev_motor_packets[1] = None
+            next_heartbeat += HEARTBEAT_INTERVAL
+            if next_heartbeat <= loop.time():
+                next_heartbeat = loop.time() + HEARTBEAT_INTERVAL
+        speeds_changed.clear()
 
         if emergency_stop.is_set():
             motor_speeds[0] = motor_speeds[1] = 0
 
-        success = send_motor_speeds(ser, motor_speeds, emergency_stop)
+        success = send_motor_speeds(ser_fd, motor_speeds, prev_motor_packets, emergency_stop, speeds_changed)
         if not success:
             break
 
-        communication_stop.wait(0.01)
+        # Controller batches that arrive during this pause collapse into the next send
+        await asyncio.sleep(SEND_INTERVAL)
+
 
+async def process_controller_events(controller: InputDevice, motor_speeds: List[int],
+                                    prev_motor_packets: List[Optional[bytes]], ser: serial.Serial,
+                                    emergency_stop: asyncio.Event, speeds_changed: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    disconnected = loop.create_future()
+    # Read raw input_event structs straight from the device instead of building an InputEvent per event
+    fd = controller.fd
+    buffer = bytearray(INPUT_EVENT.size * INPUT_EVENT_BATCH)
 
-def process_controller_events(controller: InputDevice, motor_speeds: List[int], ser: serial.Serial,
-                              communication_stop: threading.Event, emergency_stop: threading.Event) -> None:
-    while not communication_stop.is_set():
+    def on_controller_ready() -> None:
         try:
-            for event in controller.read_loop():
-                handle_event(event, motor_speeds, ser, emergency_stop)
+            size = os.readv(fd, [buffer])
+        except BlockingIOError:
+            return
         except OSError as e:
-            if e.errno == 19:
-                raspberry_pi_logger.warning("Controller disconnected.")
-                emergency_shutoff(ser, emergency_stop, motor_speeds)
-                break
-            else:
-                raise
+            loop.remove_reader(fd)
+            if not disconnected.done():
+                disconnected.set_exception(e)
+            return
+
+        # Apply every queued event before waking the sender once for the whole batch
+        changed = False
+        for _, _, event_type, code, value in INPUT_EVENT.iter_unpack(memoryview(buffer)[:size]):
+            changed |= handle_event(event_type, code, value, motor_speeds, prev_motor_packets, ser, emergency_stop)
+        if changed:
+            speeds_changed.set()
+
+    # Registered once for the whole session rather than re-armed on every read
+    loop.add_reader(fd, on_controller_ready)
+    try:
+        await disconnected
+    except OSError as e:
+        if e.errno == 19:
+            raspberry_pi_logger.warning("Controller disconnected.")
+            emergency_shutoff(ser, emergency_stop, motor_speeds, prev_motor_packets)
+        else:
+            raise
+    finally:
+        loop.remove_reader(fd)
 
 
 def find_sabertooth_port() -> Optional[str]:
-    sabertooth_ports = []
-    for port_pattern in SABERTOOTH_SERIAL_PORTS:
-        sabertooth_ports.extend(glob.glob(port_pattern))
-    return sabertooth_ports[0] if sabertooth_ports else None
+    for pattern, prefix in SERIAL_PORT_PATTERNS:
+        if prefix is None:
+            ports = glob.glob(pattern)
+            if ports:
+                return ports[0]
+            continue
+
+        directory, name_prefix = prefix
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith(name_prefix):
+                        return entry.path
+        except OSError:
+            # A directory that is missing or can't be listed has no ports in it, as with glob
+            continue
+    return None
 
 
-def connect_sabertooth() -> Optional[serial.Serial]:
-    sabertooth_port = find_sabertooth_port()
-    if sabertooth_port:
-        try:
-            return serial.Serial(sabertooth_port, 115200, timeout=0.01)
-        except serial.SerialException as e:
-            raspberry_pi_logger.warning(f"Unable to connect to Sabertooth: {e}")
+def connect_sabertooth(sabertooth_port: str) -> Optional[serial.Serial]:
+    try:
+        # write_timeout bounds pyserial's own writes, the emergency stop packets; motor packets bypass
+        # pyserial and are bounded in write_packets
+        ser = serial.Serial(sabertooth_port, 115200, timeout=0.01, write_timeout=SERIAL_WRITE_TIMEOUT)
+        # Motor packets are written straight to the fd from the event loop, which must never block on it
+        os.set_blocking(ser.fileno(), False)
+        # Drop anything left queued from before a reconnect
+        ser.reset_output_buffer()
+        return ser
+    except serial.SerialException as e:
+        raspberry_pi_logger.warning(f"Unable to connect to Sabertooth: {e}")
     return None
 
 
-def sabertooth_serial_reader(ser: serial.Serial, communication_stop: threading.Event) -> None:
-    while not communication_stop.is_set():
+async def sabertooth_serial_reader(ser: serial.Serial) -> None:
+    loop = asyncio.get_running_loop()
+    failed = loop.create_future()
+    fd = ser.fileno()
+    buffer = bytearray()
+
+    def on_serial_ready() -> None:
+        # One read of everything queued on the non-blocking fd, instead of pyserial's in_waiting ioctl and select
         try:
-            sabertooth_output = ser.readline().decode('utf-8').rstrip()
+            chunk = os.read(fd, SERIAL_READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            loop.remove_reader(fd)
+            if not failed.done():
+                failed.set_exception(e)
+            return
+
+        if not chunk:
+            loop.remove_reader(fd)
+            if not failed.done():
+                failed.set_exception(SerialException("device reports readiness to read but returned no data"))
+            return
+        buffer.extend(chunk)
+
+        # Log every complete line in the buffer and keep the partial tail for the next read
+        while True:
+            end = buffer.find(b'\n')
+            if end < 0:
+                break
+            sabertooth_output = buffer[:end].decode('utf-8', 'replace').rstrip()
+            del buffer[:end + 1]
             if sabertooth_output:
                 sabertooth_logger.info(sabertooth_output)
-        except SerialException as e:
-            raspberry_pi_logger.error(f"Error reading Sabertooth log: {e}")
-            break
-        communication_stop.wait(0.01)
+
+    loop.add_reader(fd, on_serial_ready)
+    try:
+        await failed
+    except (OSError, SerialException) as e:
+        raspberry_pi_logger.error(f"Error reading Sabertooth log: {e}")
+    finally:
+        loop.remove_reader(fd)
 
 
-def main() -> None:
+async def stop_tasks(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    # Wait for the tasks to finish so they unregister the port from the event loop before it is closed
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def request_shutdown(main_task: asyncio.Task) -> None:
+    raspberry_pi_logger.warning("Exiting due to SIGTERM")
+    main_task.cancel()
+
+
+async def main_async() -> None:
     controller: Optional[InputDevice] = None
     ser: Optional[serial.Serial] = None
+    serial_tasks: List[asyncio.Task] = []
     motor_speeds = [0, 0]
-    communication_stop = threading.Event()
-    emergency_stop = threading.Event()
+    prev_motor_packets: List[Optional[bytes]] = [None, None]
+    emergency_stop = asyncio.Event()
+    speeds_changed = asyncio.Event()
+    # Started before the first scan so devices plugged in while we look are not missed
+    udev_context = pyudev.Context()
+    device_monitor = start_device_monitor(udev_context)
+    # systemd stops the service with SIGTERM, which arrives through the loop's signal wakeup fd and
+    # cancels this task so the cleanup below runs
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, request_shutdown, asyncio.current_task())
 
-    while True:
-        try:
-            if not controller:
-                controller = find_controller()
-
-                if controller:
-                    raspberry_pi_logger.info("Controller connected")
-                    controller.grab()
-                else:
-                    raspberry_pi_logger.warning("Controller not found. Retrying in 1 second.")
-                    communication_stop.wait(1)
-                    continue
-
-            if not ser:
-                ser = connect_sabertooth()
+    try:
+        while True:
+            try:
+                if not controller:
+                    controller = find_controller(udev_context)
+
+                    if controller:
+                        raspberry_pi_logger.info("Controller connected")
+                        controller.grab()
+                    else:
+                        raspberry_pi_logger.warning("Controller not found. Waiting for it to connect.")
+                        await wait_for_device_added(device_monitor)
+                        continue
+
+                if not ser:
+                    sabertooth_port = find_sabertooth_port()
+                    if not sabertooth_port:
+                        raspberry_pi_logger.warning("Sabertooth not found. Waiting for it to connect.")
+                        await wait_for_device_added(device_monitor)
+                        continue
+
+                    ser = connect_sabertooth(sabertooth_port)
+                    if ser:
+                        raspberry_pi_logger.info("Sabertooth connected")
+                        serial_tasks = [
+                            asyncio.create_task(sabertooth_serial_reader(ser)),
+                            asyncio.create_task(motor_speed_sender(ser, motor_speeds, prev_motor_packets,
+                                                                   emergency_stop, speeds_changed)),
+                        ]
+                    else:
+                        # The port's add event has already been seen, so an open that fails right after plug-in
+                        # (permissions not yet applied, device busy) is retried after 5 seconds
+                        raspberry_pi_logger.warning("Unable to open Sabertooth port. Retrying in 5 seconds.")
+                        try:
+                            await asyncio.wait_for(wait_for_device_added(device_monitor), 5)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+
+                # The serial tasks outlive a controller session and only finish when the port has failed
+                event_task = asyncio.create_task(process_controller_events(controller, motor_speeds,
+                                                                           prev_motor_packets, ser,
+                                                                           emergency_stop, speeds_changed))
+                try:
+                    done, _ = await asyncio.wait([event_task, *serial_tasks], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    # Left running only on shutdown or a failed port
+                    await stop_tasks([event_task])
+                if event_task not in done:
+                    raise SerialException("Sabertooth port stopped responding")
+                await event_task
+
+                ungrab_controller(controller)
+                controller = None
+
+            except (OSError, serial.SerialException) as e:
+                raspberry_pi_logger.error(f"Error in communication with Sabertooth: {e}")
+                await stop_tasks(serial_tasks)
                 if ser:
-                    raspberry_pi_logger.info("Sabertooth connected")
-                    sabertooth_log_thread = threading.Thread(target=sabertooth_serial_reader,
-                                                             args=(ser, communication_stop))
-                    sabertooth_log_thread.daemon = True
-                    sabertooth_log_thread.start()
-
-                    motor_speed_sender_thread = threading.Thread(target=motor_speed_sender,
-                                                                 args=(
-                                                                     ser, motor_speeds, communication_stop,
-                                                                     emergency_stop))
-                    motor_speed_sender_thread.daemon = True
-                    motor_speed_sender_thread.start()
-                else:
-                    raspberry_pi_logger.warning("Sabertooth not found. Retrying in 1 second.")
-                    communication_stop.wait(1)
-                    continue
-
-            if controller and ser:
-                event_thread = threading.Thread(target=process_controller_events,
-                                                args=(
-                                                    controller, motor_speeds, ser, communication_stop, emergency_stop))
-                event_thread.daemon = True
-                event_thread.start()
-
-                while event_thread.is_alive():
-                    communication_stop.wait(0.01)
-            else:
-                communication_stop.wait(0.01)
-
+                    ser.close()
+                    ser = None
+                # The port may still be present after a transient error, so fall back to retrying after 5 seconds
+                try:
+                    await asyncio.wait_for(wait_for_device_added(device_monitor), 5)
+                except asyncio.TimeoutError:
+                    pass
+
+    except Exception as e:
+        raspberry_pi_logger.error(f"Unhandled exception: {e}")
+
+    finally:
+        await stop_tasks(serial_tasks)
+        if controller:
             ungrab_controller(controller)
-            controller = None
+        if ser:
+            ser.close()
 
-        except KeyboardInterrupt:
-            raspberry_pi_logger.warning("Exiting due to keyboard interrupt")
-            communication_stop.set()
-            ungrab_controller(controller)
-            if ser:
-                ser.close()
-            break
 
-        except (OSError, serial.SerialException) as e:
-            raspberry_pi_logger.error(f"Error in communication with Sabertooth: {e}")
-            if ser:
-                ser.close()
-                ser = None
-            communication_stop.wait(5)
+def set_realtime_priority() -> None:
+    # The scheduler goes first, since it is the step that needs CAP_SYS_NICE, so a failure leaves nothing changed
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(50))
+    except OSError as e:
+        raspberry_pi_logger.warning(f"Unable to set real-time priority, continuing with default scheduling: {e}")
+        return
 
-        except Exception as e:
-            raspberry_pi_logger.error(f"Unhandled exception: {e}")
-            ungrab_controller(controller)
-            if ser:
-                ser.close()
-            break
+    # The highest CPU we may run on, which is the one kept free with isolcpus=3 on a quad-core Pi, see README
+    cpu = max(os.sched_getaffinity(0))
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError as e:
+        raspberry_pi_logger.warning(f"Unable to pin to CPU {cpu}, running with SCHED_FIFO priority on any CPU: {e}")
+        return
+    raspberry_pi_logger.info(f"Running with SCHED_FIFO priority on CPU {cpu}")
+
+
+def main() -> None:
+    set_realtime_priority()
+    try:
+        asyncio.run(main_async())
+    except KeyboardInterrupt:
+        raspberry_pi_logger.warning("Exiting due to keyboard interrupt")
+    except asyncio.CancelledError:
+        pass
 
 
 if __name__ == "__main__":